@@ -1,16 +1,67 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Response, Query, Request
 from fastapi.responses import FileResponse, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.background import BackgroundTask
+from starlette.datastructures import Headers
 from starlette.exceptions import HTTPException as StarletteHTTPException
+import asyncio
+import math
 import tempfile
 import os
 import shutil
 import uuid
-from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Optional
+import time
+import threading
+import multiprocessing
+import queue
+import hashlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, List, Optional
 import subprocess
+import wave
+
+# Cap BLAS/OpenMP pools before numpy loads: the libraries size their pools
+# when they initialize, which happens here in the parent — before the worker
+# pool forks — so setting these in the worker initializer is too late. Keeps
+# each mastering worker from spawning a full-width BLAS pool and oversubscribing
+# the box when several jobs run at once.
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "2")
+
 import numpy as np
-import librosa
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import rfft as _rfft, irfft as _irfft
+import soundfile as sf
+
+try:
+    import aiofiles
+    _HAS_AIOFILES = True
+except ImportError:  # optional; upload writes fall back to a worker thread
+    _HAS_AIOFILES = False
+
+try:
+    import av
+    _HAS_AV = True
+except ImportError:  # optional; conversion falls back to the ffmpeg subprocess
+    _HAS_AV = False
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:  # numba is optional; analysis falls back to plain numpy
+    _HAS_NUMBA = False
+
+try:
+    # Import once at module load: matchering drags in heavy scipy/numpy
+    # modules, so paying this on the first request caused cold-start spikes
+    import matchering as mg
+    mg.log(print)
+except ImportError:
+    mg = None
 
 app = FastAPI(title="StudioBuddy Matchering API")
 
@@ -31,62 +82,81 @@ def get_cors_origin(request_origin: str) -> str:
     # Fallback to first allowed origin or *
     return ALLOWED_ORIGINS[0] if ALLOWED_ORIGINS else "*"
 
-# Add standard CORS middleware first
+class RangeAwareGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that steps aside for Range requests.
+
+    Starlette's GZipMiddleware (through 0.41) compresses 206 responses too,
+    rewriting the body while Content-Range still describes uncompressed
+    offsets — which corrupts every resumed download or seek. Full downloads
+    keep the compression."""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and Headers(scope=scope).get("range"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress large responses when the client accepts it. Mastered PCM WAVs
+# still shrink 30-50% (silence and correlated samples), and level 1 keeps the
+# CPU cost negligible; small JSON responses are left alone by minimum_size.
+app.add_middleware(RangeAwareGZipMiddleware, minimum_size=1_000_000, compresslevel=1)
+
+MAX_UPLOAD_BYTES = 210 * 1024 * 1024  # a bit above the documented 200MB per-file limit
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject oversized uploads from the Content-Length header alone, before
+    the multipart body is streamed and spooled to disk."""
+    if request.method == "POST":
+        try:
+            content_length = int(request.headers.get("content-length", "0"))
+        except ValueError:
+            content_length = 0
+        if content_length > MAX_UPLOAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": "Request body too large. Maximum upload size is 200MB."},
+            )
+    return await call_next(request)
+
+
+# Single CORS layer: CORSMiddleware answers preflights and stamps headers on
+# every outgoing response. Added last so it is the outermost layer and wraps
+# both HTTPException responses and the 413 short-circuit above.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["*"],
+    max_age=86400,
 )
 
-# Manual CORS middleware as backup
-@app.middleware("http")
-async def cors_handler(request: Request, call_next):
-    request_origin = request.headers.get("origin", "")
-    cors_origin = get_cors_origin(request_origin)
-    
-    # Handle preflight requests immediately
-    if request.method == "OPTIONS":
-        return Response(
-            status_code=200,
-            headers={
-                "Access-Control-Allow-Origin": cors_origin,
-                "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-                "Access-Control-Allow-Headers": "*",
-                "Access-Control-Max-Age": "86400",
-            }
-        )
-    
-    response = await call_next(request)
-    
-    # Add CORS headers to every response
-    response.headers["Access-Control-Allow-Origin"] = cors_origin
-    response.headers["Access-Control-Allow-Methods"] = "GET, POST, PUT, DELETE, OPTIONS"
-    response.headers["Access-Control-Allow-Headers"] = "*"
-    response.headers["Access-Control-Expose-Headers"] = "*"
-    
-    return response
 
-# Custom exception handler to ensure CORS headers are always present
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
-    """Custom exception handler that ensures CORS headers are always included"""
-    request_origin = request.headers.get("origin", "")
-    cors_origin = get_cors_origin(request_origin)
-    
-    headers = {
-        "Access-Control-Allow-Origin": cors_origin,
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "*",
-        "Access-Control-Expose-Headers": "*",
-    }
+    """HTTPException responses travel back through the middleware stack, so
+    CORSMiddleware stamps their headers — no manual injection needed."""
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
-        headers=headers
     )
 
+# Constant CORS headers for the one handler below that must inject them
+# manually; only Allow-Origin varies per request
+_CORS_STATIC_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
+    "Access-Control-Allow-Headers": "*",
+    "Access-Control-Expose-Headers": "*",
+}
+
+
+# The catch-all Exception handler runs in Starlette's outermost
+# ServerErrorMiddleware, *outside* CORSMiddleware, so this one still has to
+# add CORS headers itself for browsers to surface the error
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     """Handle all other exceptions with CORS headers"""
@@ -94,15 +164,8 @@ async def general_exception_handler(request: Request, exc: Exception):
     import traceback
     traceback.print_exc()
     
-    request_origin = request.headers.get("origin", "")
-    cors_origin = get_cors_origin(request_origin)
-    
-    headers = {
-        "Access-Control-Allow-Origin": cors_origin,
-        "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
-        "Access-Control-Allow-Headers": "*",
-        "Access-Control-Expose-Headers": "*",
-    }
+    headers = dict(_CORS_STATIC_HEADERS)
+    headers["Access-Control-Allow-Origin"] = get_cors_origin(request.headers.get("origin", ""))
     return JSONResponse(
         status_code=500,
         content={"detail": f"Internal server error: {str(exc)}"},
@@ -127,9 +190,73 @@ async def test_cors():
     return {"message": "CORS POST test successful", "timestamp": "2024-08-14"}
 
 
-# Simple in-memory job store (prototype)
-executor = ThreadPoolExecutor(max_workers=1)
-JOBS: Dict[str, Dict[str, Optional[str]]] = {}
+def _worker_init() -> None:
+    """Pool-worker startup: pay matchering's heavy scipy/numpy import once per
+    worker process instead of on the first job it handles. BLAS/OpenMP thread
+    caps are already in place: the module-import hook sets them before numpy
+    loads, and each forkserver worker re-imports the module on startup."""
+    import matchering
+    matchering.log(print)
+
+
+# Simple in-memory job store (prototype). Mastering is CPU-bound numpy work,
+# so jobs run in a process pool (threads would serialize on the GIL); capped
+# at 4 workers by default to keep memory in check on small instances, and
+# overridable per deployment since each worker holds a full track in RAM.
+MAX_CONCURRENT_JOBS = int(os.getenv("MAX_CONCURRENT_JOBS", str(min(os.cpu_count() or 2, 4))))
+# Workers come from a forkserver, not a lazy fork() of this process: the pool
+# forks on the first submit, and by then the reaper thread, to_thread workers
+# and numba's TBB pool are all running — fork() from a threaded parent copies
+# their locks in an undefined state into the child (numba warns about exactly
+# this). The forkserver forks from a clean single-threaded helper instead;
+# each worker re-imports this module, which also re-applies the BLAS caps
+# above before numpy loads.
+executor = ProcessPoolExecutor(
+    max_workers=MAX_CONCURRENT_JOBS,
+    initializer=_worker_init,
+    mp_context=multiprocessing.get_context("forkserver"),
+)
+JOBS: Dict[str, dict] = {}
+JOBS_LOCK = threading.Lock()
+JOB_TTL_SECONDS = 30 * 60  # evict terminal jobs (and their tmpdirs) after 30 min
+MAX_JOBS = 10_000  # hard cap so a poll-happy client can't grow JOBS faster than the TTL sweep
+
+
+def _evict_overflow_locked() -> None:
+    """Drop the oldest (preferably terminal) jobs beyond MAX_JOBS.
+    Caller must hold JOBS_LOCK; dicts iterate in insertion order."""
+    while len(JOBS) > MAX_JOBS:
+        victim = next(
+            (jid for jid, job in JOBS.items() if job.get("status") in ("done", "error")),
+            next(iter(JOBS)),
+        )
+        tmpdir = JOBS[victim].get("tmpdir")
+        del JOBS[victim]
+        if tmpdir:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def _reap_jobs() -> None:
+    """Background sweep: drop finished/failed jobs older than the TTL so the
+    JOBS dict and its tmpdirs stay bounded over the server's lifetime."""
+    while True:
+        time.sleep(60)
+        now = time.time()
+        with JOBS_LOCK:
+            expired = [
+                jid for jid, job in JOBS.items()
+                if job.get("status") in ("done", "error") and now - job.get("finished_at", now) > JOB_TTL_SECONDS
+            ]
+            for jid in expired:
+                tmpdir = JOBS[jid].get("tmpdir")
+                del JOBS[jid]
+                if tmpdir:
+                    shutil.rmtree(tmpdir, ignore_errors=True)
+        if expired:
+            print(f"[reaper] Evicted {len(expired)} expired job(s)")
+
+
+threading.Thread(target=_reap_jobs, daemon=True, name="job-reaper").start()
 
 
 @app.get("/health", response_class=PlainTextResponse)
@@ -142,20 +269,18 @@ async def master_audio(
     request: Request,
     audio: UploadFile = File(...),
     reference: UploadFile = File(None),
-    target_lufs: float = Query(-14.0, description="Target LUFS for output level"),
-    max_peak: float = Query(-1.0, description="Maximum peak level in dB"),
+    target_lufs: Optional[float] = Query(None, description="Target LUFS for output level (omit to keep matchering's own leveling)"),
+    max_peak: Optional[float] = Query(None, description="Maximum peak level in dB (omit to keep matchering's own limiter)"),
 ):
     print(f"[MASTER] Received request: audio={audio.filename}, reference={reference.filename if reference else None}")
     print(f"[MASTER] Request headers: {dict(request.headers)}")
     
     # Create a temp working directory
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with _borrow_tmpdir() as tmpdir:
         try:
-            print("[MASTER] Importing matchering library...")
-            # Lazy import to speed up cold start
-            import matchering as mg  # type: ignore
-            print("[MASTER] Matchering import successful")
-            
+            if mg is None:
+                raise HTTPException(status_code=500, detail="matchering library not available")
+
             # Validate file
             if not audio.filename:
                 raise HTTPException(status_code=400, detail="No filename provided")
@@ -177,34 +302,25 @@ async def master_audio(
             if file_ext not in allowed_extensions:
                 raise HTTPException(status_code=400, detail=f"Unsupported file format {file_ext}. Supported: {', '.join(allowed_extensions)}")
             
-            target_upload = os.path.join(tmpdir, audio.filename or "target")
             output_path = os.path.join(tmpdir, "mastered.wav")
 
-            print(f"[MASTER] Saving uploaded file: {audio.filename}")
-            # Save audio file to disk
-            with open(target_upload, "wb") as f:
-                shutil.copyfileobj(audio.file, f)
-            
-            saved_size = os.path.getsize(target_upload)
-            print(f"[MASTER] Saved file size: {saved_size} bytes")
-
-            # Pre-convert to WAV with ffmpeg to handle odd headers/corruption
-            t_wav = _to_wav(target_upload, tmpdir)
-            
-            # Handle reference file
+            print(f"[MASTER] Ingesting uploaded file: {audio.filename}")
+            # Compressed uploads are piped straight into ffmpeg's stdin (no
+            # intermediate copy on disk); WAVs persist as-is so the canonical-
+            # format skip applies. Runs off the event loop either way, and
+            # both files ingest concurrently so one conversion overlaps the
+            # other's write + decode.
             if reference and reference.filename:
-                reference_upload = os.path.join(tmpdir, reference.filename or "reference")
-                with open(reference_upload, "wb") as f:
-                    shutil.copyfileobj(reference.file, f)
-                r_wav = _to_wav(reference_upload, tmpdir)
+                t_wav, r_wav = await asyncio.gather(
+                    asyncio.to_thread(_ingest_to_wav, audio, tmpdir, "target"),
+                    asyncio.to_thread(_ingest_to_wav, reference, tmpdir, "reference"),
+                )
             else:
                 # Use the audio file as both target and reference for auto-mastering
+                t_wav = await asyncio.to_thread(_ingest_to_wav, audio, tmpdir, "target")
                 r_wav = t_wav
 
             # Process via Matchering
-            from importlib import import_module  # late import
-            mg = import_module("matchering")
-            mg.log(print)
             mg.process(target=t_wav, reference=r_wav, results=[mg.pcm16(output_path)])
 
             # Check if file exists after processing
@@ -212,26 +328,58 @@ async def master_audio(
                 print(f"[MASTER] ERROR: Output file not found at {output_path}")
                 raise HTTPException(status_code=500, detail="Mastering failed: output not created")
             
-            # Apply volume control and clipping prevention
-            print(f"[MASTER] Applying volume control (target LUFS: {target_lufs}, max peak: {max_peak})")
-            output_path = _apply_volume_control(output_path, tmpdir, target_lufs, max_peak)
+            # Apply volume control and clipping prevention only when the
+            # caller asked for specific levels — matchering's own limiter
+            # already normalizes the default case, and skipping saves a full
+            # decode + process + re-encode pass over the track
+            if target_lufs is None and max_peak is None:
+                print("[MASTER] No level overrides requested, keeping matchering output as-is")
+            else:
+                print(f"[MASTER] Applying volume control (target LUFS: {target_lufs}, max peak: {max_peak})")
+                output_path = _apply_volume_control(
+                    output_path,
+                    tmpdir,
+                    target_lufs if target_lufs is not None else -14.0,
+                    max_peak if max_peak is not None else -1.0,
+                )
             
             print(f"[MASTER] Returning mastered file from {output_path}")
             print(f"[MASTER] File size: {os.path.getsize(output_path)} bytes")
-            
-            # Read file content and return as Response instead of FileResponse
-            # This avoids issues with temporary directory cleanup
-            with open(output_path, "rb") as f:
-                content = f.read()
-            
-            return Response(
-                content=content,
+
+            # Move the result out of the pooled scratch dir so FileResponse
+            # can stream it (sendfile, no whole-file read into RAM) after the
+            # scratch dir is wiped; the copy is unlinked once the response
+            # has been sent
+            final_path = os.path.join(_DOWNLOAD_DIR, f"{uuid.uuid4().hex}.wav")
+            shutil.move(output_path, final_path)
+
+            # Clients that opt in via Accept get Opus instead of raw PCM —
+            # ~10x less egress for the same listen-through quality
+            if "audio/opus" in request.headers.get("accept", ""):
+                opus_path = f"{final_path}.opus"
+                if await asyncio.to_thread(_transcode_to_opus, final_path, opus_path):
+                    os.unlink(final_path)
+                    return FileResponse(
+                        opus_path,
+                        media_type="audio/opus",
+                        filename="mastered.opus",
+                        stat_result=os.stat(opus_path),
+                        headers={"Accept-Ranges": "bytes"},
+                        background=BackgroundTask(os.unlink, opus_path),
+                    )
+
+            return FileResponse(
+                final_path,
                 media_type="audio/wav",
-                headers={
-                    "Content-Disposition": "attachment; filename=mastered.wav",
-                    "Content-Length": str(len(content))
-                }
+                filename="mastered.wav",
+                stat_result=os.stat(final_path),
+                headers={"Accept-Ranges": "bytes"},
+                background=BackgroundTask(os.unlink, final_path),
             )
+        except HTTPException:
+            # Ingest/validation errors (400/413/415) already carry the right
+            # status — don't rewrap them as 500s
+            raise
         except Exception as e:
             print(f"[ERROR] Mastering failed: {e}")
             import traceback
@@ -239,25 +387,124 @@ async def master_audio(
             raise HTTPException(status_code=500, detail=f"Mastering error: {str(e)}")
 
 
-def _run_matchering_job(tmpdir: str, target_path: str, reference_path: str, output_path: str, job_id: str) -> None:
+def _transcode_to_opus(wav_path: str, opus_path: str) -> bool:
+    """Encode a mastered WAV to 128kbps Opus — roughly 10x smaller than PCM,
+    for clients that opt in via the Accept header. Returns False (so the
+    caller falls back to WAV) when the ffmpeg build lacks libopus.
+
+    Encodes to a private temp name and os.replace()s into place, so
+    opus_path is only ever absent or a complete file: a failed or timed-out
+    encode can't leave a partial result for later requests to serve, and
+    concurrent encodes of the same job can't interleave writes."""
+    tmp_path = f"{opus_path}.{uuid.uuid4().hex}.tmp"
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-threads", _FFMPEG_THREADS,
+        "-y",
+        "-loglevel", "error",
+        "-i", wav_path,
+        "-c:a", "libopus",
+        "-b:a", "128k",
+        "-f", "opus",  # .tmp suffix defeats ffmpeg's extension sniffing
+        tmp_path,
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+    except Exception as e:
+        print(f"[_transcode_to_opus] ffmpeg failed ({e}), serving WAV")
+        result = None
+    if result is None or result.returncode != 0:
+        if result is not None:
+            print(f"[_transcode_to_opus] ffmpeg exited {result.returncode}: {result.stderr[-200:]}")
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        return False
+    try:
+        if os.path.getsize(tmp_path) == 0:
+            os.unlink(tmp_path)
+            return False
+        os.replace(tmp_path, opus_path)
+    except OSError:
+        return False
+    return True
+
+
+def _run_matchering_job(tmpdir: str, target_path: str, reference_path: str, output_path: str) -> str:
+    """Runs inside a pool worker process; returns the output path or raises."""
     try:
-        from importlib import import_module
-        mg = import_module("matchering")
-        JOBS[job_id]["status"] = "running"
-        mg.log(print)
-        # Pre-convert to WAV with ffmpeg first
-        t_wav = _to_wav(target_path, tmpdir)
-        r_wav = _to_wav(reference_path, tmpdir)
+        if mg is None:
+            raise RuntimeError("matchering library not available")
+        # Pre-convert to WAV first; both files share one ffmpeg launch when
+        # neither hits a cheaper fast path
+        t_wav, r_wav = _to_wav_batch([target_path, reference_path], tmpdir)
         mg.process(target=t_wav, reference=r_wav, results=[mg.pcm16(output_path)])
-        if os.path.exists(output_path):
-            JOBS[job_id]["status"] = "done"
-            JOBS[job_id]["output_path"] = output_path
-        else:
-            JOBS[job_id]["status"] = "error"
-            JOBS[job_id]["message"] = "Output not created"
+        if not os.path.exists(output_path):
+            raise RuntimeError("Output not created")
+        return output_path
     except Exception as e:
-        JOBS[job_id]["status"] = "error"
-        JOBS[job_id]["message"] = str(e)
+        # Re-raise as a plain RuntimeError so the error always pickles back
+        # to the parent process intact
+        raise RuntimeError(str(e)) from None
+
+
+def _on_job_done(job_id: str, future) -> None:
+    """Parent-side callback: record the worker's result in JOBS."""
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job is None:
+            return
+        err = future.exception()
+        if err is None:
+            job["status"] = "done"
+            job["output_path"] = future.result()
+            job["has_output"] = True
+        else:
+            job["status"] = "error"
+            job["message"] = str(err)
+        job["finished_at"] = time.time()
+        if job.get("batch"):
+            _roll_up_batch_locked(job["batch"])
+
+
+def _roll_up_batch_locked(batch_id: str) -> None:
+    """Mark a batch terminal once every child is, so the TTL reaper can
+    eventually reclaim the shared tmpdir. Caller must hold JOBS_LOCK."""
+    batch = JOBS.get(batch_id)
+    if batch is None:
+        return
+    statuses = [JOBS[cid]["status"] for cid in batch["children"] if cid in JOBS]
+    if any(s not in ("done", "error") for s in statuses):
+        return
+    failed = statuses.count("error")
+    batch["status"] = "done" if failed == 0 else "error"
+    if failed:
+        batch["message"] = f"{failed}/{len(batch['children'])} track(s) failed"
+    batch["finished_at"] = time.time()
+
+
+def _abort_job(job_id: str, message: str) -> None:
+    """Mark a job terminal after a pre-submit failure (ingest, validation).
+
+    Without this the entry stays "queued" forever — the reaper only evicts
+    done/error jobs — and its tmpdir leaks on /dev/shm. Drops the tmpdir
+    immediately rather than waiting out the TTL."""
+    with JOBS_LOCK:
+        job = JOBS.get(job_id)
+        if job is None:
+            return
+        job["status"] = "error"
+        job["message"] = message
+        job["finished_at"] = time.time()
+        tmpdir = job.get("tmpdir")
+        job["tmpdir"] = None
+        if job.get("batch"):
+            _roll_up_batch_locked(job["batch"])
+    if tmpdir:
+        shutil.rmtree(tmpdir, ignore_errors=True)
 
 
 @app.post("/master/start")
@@ -265,96 +512,609 @@ async def master_start(
     target: UploadFile = File(...),
     reference: UploadFile = File(...),
 ):
-    tmpdir = tempfile.mkdtemp(prefix="job-")
+    tmpdir = tempfile.mkdtemp(prefix="job-", dir=_scratch_base())
     job_id = uuid.uuid4().hex
-    JOBS[job_id] = {"status": "queued", "message": None, "output_path": None, "tmpdir": tmpdir}
+    with JOBS_LOCK:
+        JOBS[job_id] = {"status": "queued", "message": None, "output_path": None, "tmpdir": tmpdir, "has_output": False}
+        _evict_overflow_locked()
 
-    target_path = os.path.join(tmpdir, target.filename or "target")
-    reference_path = os.path.join(tmpdir, reference.filename or "reference")
     output_path = os.path.join(tmpdir, "mastered.wav")
 
-    with open(target_path, "wb") as f:
-        shutil.copyfileobj(target.file, f)
-    with open(reference_path, "wb") as f:
-        shutil.copyfileobj(reference.file, f)
+    # Convert at ingest: compressed uploads stream through ffmpeg's stdin
+    # straight to WAV, so the original bytes never hit disk and the worker
+    # doesn't redo a full write + read + convert pass per file. Both uploads
+    # ingest concurrently so the conversions overlap.
+    try:
+        target_path, reference_path = await asyncio.gather(
+            asyncio.to_thread(_ingest_to_wav, target, tmpdir, "target"),
+            asyncio.to_thread(_ingest_to_wav, reference, tmpdir, "reference"),
+        )
+    except Exception as e:
+        _abort_job(job_id, getattr(e, "detail", None) or str(e))
+        raise
 
-    executor.submit(_run_matchering_job, tmpdir, target_path, reference_path, output_path, job_id)
+    try:
+        future = executor.submit(_run_matchering_job, tmpdir, target_path, reference_path, output_path)
+    except Exception as e:
+        # BrokenProcessPool after a worker died (e.g. OOM on a big track) or
+        # a shut-down executor: the job must still reach a terminal state
+        _abort_job(job_id, f"Could not queue job: {e}")
+        raise HTTPException(status_code=503, detail="Mastering workers unavailable; try again shortly")
+    # Flip queued -> running before attaching the callback: a future that
+    # fails instantly fires the callback on attach, and writing "running"
+    # afterwards would stomp the terminal status the reaper keys off
+    with JOBS_LOCK:
+        if JOBS.get(job_id, {}).get("status") == "queued":
+            JOBS[job_id]["status"] = "running"
+    future.add_done_callback(partial(_on_job_done, job_id))
     return {"job_id": job_id}
 
 
+@app.post("/master/batch")
+async def master_batch(
+    targets: List[UploadFile] = File(...),
+    reference: UploadFile = File(...),
+):
+    """Master several targets against one reference in a single request.
+
+    Each track becomes its own pool job, so an album fans out across
+    min(N, workers) cores instead of serializing through repeated
+    /master/start calls. The reference is ingested once and shared
+    read-only by every child run; each child converts into its own
+    subdirectory so concurrent ffmpeg passes never collide.
+    """
+    if not targets:
+        raise HTTPException(status_code=400, detail="No target files provided")
+
+    tmpdir = tempfile.mkdtemp(prefix="batch-", dir=_scratch_base())
+    batch_id = uuid.uuid4().hex
+    child_ids = [uuid.uuid4().hex for _ in targets]
+    with JOBS_LOCK:
+        for cid in child_ids:
+            # Children carry no tmpdir of their own; the batch record owns
+            # the shared scratch dir and the reaper frees it once the batch
+            # itself expires
+            JOBS[cid] = {"status": "queued", "message": None, "output_path": None,
+                         "tmpdir": None, "has_output": False, "batch": batch_id}
+        JOBS[batch_id] = {"status": "running", "message": None, "output_path": None,
+                          "tmpdir": tmpdir, "has_output": False, "children": child_ids}
+        _evict_overflow_locked()
+
+    try:
+        reference_path = await asyncio.to_thread(_ingest_to_wav, reference, tmpdir, "reference")
+    except Exception as e:
+        # A bad reference sinks every child: mark them all terminal so the
+        # reaper can forget them, and reclaim the shared tmpdir now
+        msg = f"Reference ingest failed: {getattr(e, 'detail', None) or e}"
+        for cid in child_ids:
+            _abort_job(cid, msg)
+        _abort_job(batch_id, msg)
+        raise
+
+    for i, (cid, target) in enumerate(zip(child_ids, targets)):
+        child_dir = os.path.join(tmpdir, f"track{i}")
+        os.makedirs(child_dir, exist_ok=True)
+        try:
+            target_path = await asyncio.to_thread(_ingest_to_wav, target, child_dir, f"target{i}")
+        except Exception as e:
+            # One bad track doesn't sink the album — fail its child and move on
+            _abort_job(cid, getattr(e, "detail", None) or str(e))
+            continue
+        output_path = os.path.join(child_dir, "mastered.wav")
+        try:
+            future = executor.submit(_run_matchering_job, child_dir, target_path, reference_path, output_path)
+        except Exception as e:
+            # Same terminal-state guarantee as /master/start: a broken pool
+            # fails this child instead of leaving it stuck "queued"
+            _abort_job(cid, f"Could not queue job: {e}")
+            continue
+        # queued -> running before the callback attaches, so an instantly
+        # failed future can't have its terminal status stomped back
+        with JOBS_LOCK:
+            if JOBS.get(cid, {}).get("status") == "queued":
+                JOBS[cid]["status"] = "running"
+        future.add_done_callback(partial(_on_job_done, cid))
+
+    return {"job_id": batch_id, "children": child_ids}
+
+
 @app.get("/master/status")
 def master_status(id: str = Query(..., alias="id")):
-    job = JOBS.get(id)
+    with JOBS_LOCK:
+        job = JOBS.get(id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        resp = {
+            "status": job.get("status"),
+            "message": job.get("message"),
+            # Cached by the worker on completion — no stat() per poll
+            "has_output": job.get("has_output", False),
+        }
+        if "children" in job:
+            child_statuses = {cid: JOBS[cid]["status"] for cid in job["children"] if cid in JOBS}
+            resp["children"] = child_statuses
+            resp["completed"] = sum(1 for s in child_statuses.values() if s in ("done", "error"))
+            resp["total"] = len(job["children"])
+        return resp
+
+
+@app.head("/master/result")
+def master_result_head(id: str = Query(..., alias="id")):
+    """Header-only probe: players (notably mobile Safari) stat the file to
+    size their Range requests before downloading. One os.stat, no body, and
+    no Opus transcode even when the probe carries an Accept header."""
+    with JOBS_LOCK:
+        job = JOBS.get(id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return {
-        "status": job.get("status"),
-        "message": job.get("message"),
-        "has_output": os.path.exists(job.get("output_path") or "") if job.get("output_path") else False,
-    }
+    if job.get("status") != "done" or not job.get("output_path"):
+        raise HTTPException(status_code=400, detail="Job not completed")
+    st = os.stat(job["output_path"])
+    return Response(
+        status_code=200,
+        headers={
+            "Content-Length": str(st.st_size),
+            "Content-Type": "audio/wav",
+            "Accept-Ranges": "bytes",
+        },
+    )
 
 
 @app.get("/master/result")
-def master_result(id: str = Query(..., alias="id")):
-    job = JOBS.get(id)
+def master_result(request: Request, id: str = Query(..., alias="id")):
+    with JOBS_LOCK:
+        job = JOBS.get(id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
     if job.get("status") != "done" or not job.get("output_path"):
         raise HTTPException(status_code=400, detail="Job not completed")
-    return FileResponse(job["output_path"], media_type="audio/wav", filename="mastered.wav")
+    path, media_type, filename = job["output_path"], "audio/wav", "mastered.wav"
+    # Opus on request: cached beside the job output so repeat downloads and
+    # seeks don't re-encode; reaped along with the job's tmpdir
+    if "audio/opus" in request.headers.get("accept", ""):
+        opus_path = f"{path}.opus"
+        try:
+            opus_cached = os.path.getsize(opus_path) > 0
+        except OSError:
+            opus_cached = False
+        if opus_cached or _transcode_to_opus(path, opus_path):
+            path, media_type, filename = opus_path, "audio/opus", "mastered.opus"
+    # Pass the stat up front so Starlette skips its own stat() and takes the
+    # sendfile zero-copy path under uvicorn; advertise ranges so clients can resume
+    stat = os.stat(path)
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=stat,
+        headers={"Accept-Ranges": "bytes"},
+    )
 
 
 # Utilities
+# Keep intermediate WAVs in tmpfs when possible so the ffmpeg -> matchering ->
+# volume-control shuffle never touches disk; skipped when /dev/shm is missing
+# (macOS, some containers) or running low on space.
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+_SHM_MIN_FREE = 1 << 30  # fall back to disk below 1 GiB free
+
+
+def _scratch_base() -> Optional[str]:
+    """Directory to create scratch dirs in: tmpfs when it has headroom, else default TMPDIR."""
+    if _SHM_DIR is None:
+        return None
+    try:
+        if shutil.disk_usage(_SHM_DIR).free < _SHM_MIN_FREE:
+            return None
+    except OSError:
+        return None
+    return _SHM_DIR
+
+
+_TMPDIR_POOL: "queue.Queue[str]" = queue.Queue(maxsize=64)
+# Finished /master outputs live here just long enough to be streamed out
+_DOWNLOAD_DIR = tempfile.mkdtemp(prefix="sb-downloads-")
+
+
+@contextmanager
+def _borrow_tmpdir():
+    """Check a scratch dir out of the pool (creating one if the pool is empty)
+    and wipe + return it afterwards, avoiding per-request mkdir/rmtree churn."""
+    try:
+        workdir = _TMPDIR_POOL.get_nowait()
+    except queue.Empty:
+        workdir = tempfile.mkdtemp(prefix="sb-", dir=_scratch_base())
+    try:
+        yield workdir
+    finally:
+        try:
+            for name in os.listdir(workdir):
+                path = os.path.join(workdir, name)
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    os.unlink(path)
+            _TMPDIR_POOL.put_nowait(workdir)
+        except (OSError, queue.Full):
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _enforce_upload_size(upload: UploadFile) -> None:
+    """413 when the spooled upload really exceeds the limit.
+
+    The middleware check trusts Content-Length, which a client can spoof or
+    omit with chunked encoding; this measures the actual spooled bytes before
+    any scratch-dir copy or decode work is spent on them.
+    """
+    size = upload.file.seek(0, os.SEEK_END)
+    upload.file.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Request body too large. Maximum upload size is 200MB.")
+
+
+async def _persist_upload_async(upload: UploadFile, path: str, hasher=None) -> None:
+    """Persist an upload in bounded async chunks without tying up the event
+    loop or a worker thread; never reads the whole body into memory.
+
+    Falls back to the threaded _persist_upload when aiofiles is missing.
+    """
+    _enforce_upload_size(upload)
+    if not _HAS_AIOFILES:
+        await asyncio.to_thread(_persist_upload, upload, path, hasher)
+        return
+    await upload.seek(0)
+    async with aiofiles.open(path, "wb") as f:
+        while chunk := await upload.read(4 * 1024 * 1024):
+            if hasher is not None:
+                hasher.update(chunk)
+            await f.write(chunk)
+
+
+def _persist_upload(upload: UploadFile, path: str, hasher=None) -> None:
+    """Write an uploaded file to disk with minimal copying.
+
+    When the SpooledTemporaryFile has spilled to a real file, os.sendfile moves
+    the bytes in-kernel with no userspace bounce buffer; otherwise a 4 MiB
+    buffer keeps the syscall count ~64x lower than copyfileobj's default.
+    Passing a hasher digests the bytes as they stream through (this skips the
+    sendfile path, which never surfaces the data to userspace).
+    """
+    src = upload.file
+    src.seek(0)
+    if hasher is not None:
+        with open(path, "wb") as dst:
+            while True:
+                chunk = src.read(4 * 1024 * 1024)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                dst.write(chunk)
+        return
+    if getattr(src, "_rolled", False) and hasattr(src, "fileno"):
+        with open(path, "wb") as dst:
+            # sendfile may move fewer bytes than asked; loop on the offset so
+            # a short write can't silently truncate the upload
+            size = os.fstat(src.fileno()).st_size
+            offset = 0
+            while offset < size:
+                sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                if sent == 0:
+                    # Kernel won't move any more in-kernel; finish the rest
+                    # through the buffered path
+                    src.seek(offset)
+                    shutil.copyfileobj(src, dst, length=4 * 1024 * 1024)
+                    return
+                offset += sent
+    else:
+        with open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, length=4 * 1024 * 1024)
+
+
+# One core is left free so ffmpeg never starves the event loop; "0" (auto)
+# would grab every core for the decode/resample stage
+_FFMPEG_THREADS = str(max(1, (os.cpu_count() or 2) - 1))
+
+
+def _probe_ffmpeg_decoders() -> frozenset:
+    """Parse `ffmpeg -decoders` once at startup so requests for formats this
+    build cannot decode fail fast with a 415 instead of a doomed subprocess
+    launch, and a missing ffmpeg shows up in the logs at boot, not on the
+    first upload. Empty set == probe failed == never pre-reject."""
+    try:
+        out = subprocess.run(
+            ["ffmpeg", "-hide_banner", "-decoders"],
+            capture_output=True, text=True, timeout=10,
+        )
+    except Exception as e:
+        print(f"[startup] ffmpeg probe failed ({e}); conversions may fail per request")
+        return frozenset()
+    if out.returncode != 0:
+        print(f"[startup] ffmpeg -decoders exited {out.returncode}")
+        return frozenset()
+    names = set()
+    for line in out.stdout.splitlines():
+        # decoder lines look like " A....D mp3    MP3 (MPEG audio layer 3)"
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].startswith("A") and parts[1] != "=":
+            names.add(parts[1])  # skip the "A..... = Audio codec" legend line
+    print(f"[startup] ffmpeg reports {len(names)} audio decoders")
+    return frozenset(names)
+
+
+_FFMPEG_DECODERS = _probe_ffmpeg_decoders()
+# Upload extensions we advertise, mapped to the decoders that can open them
+_EXT_DECODERS = {
+    ".mp3": {"mp3", "mp3float"},
+    ".m4a": {"aac"},
+    ".aac": {"aac"},
+    ".ogg": {"vorbis", "opus"},
+    ".flac": {"flac"},
+    ".wma": {"wmav2"},
+}
+
+
+def _reject_undecodable(filename: str) -> None:
+    """415 early when the build demonstrably lacks a decoder for this upload."""
+    if _HAS_AV or not _FFMPEG_DECODERS:
+        return  # PyAV carries its own codecs; no probe data means no pre-reject
+    ext = os.path.splitext(filename.lower())[1]
+    needed = _EXT_DECODERS.get(ext)
+    if needed and not (needed & _FFMPEG_DECODERS):
+        raise HTTPException(status_code=415, detail=f"This server's ffmpeg build cannot decode {ext} files")
+
+
+def _stream_to_wav(upload: UploadFile, output_path: str) -> bool:
+    """Decode an upload by piping it straight into ffmpeg's stdin.
+
+    Skips the write+read of the original file entirely. Returns False when
+    ffmpeg can't decode from a pipe (some containers need seeking) so the
+    caller can fall back to the persist-then-convert path.
+    """
+    upload.file.seek(0)
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-threads", _FFMPEG_THREADS,
+        "-filter_threads", _FFMPEG_THREADS,
+        "-y",
+        "-loglevel", "error",
+        "-err_detect", "ignore_err",
+        "-i", "pipe:0",
+        "-vn",
+        "-ac", "2",
+        "-ar", "44100",
+        "-c:a", "pcm_s16le",
+        "-f", "wav",
+        output_path,
+    ]
+    # stderr goes to a scratch file, not a pipe: nothing drains a pipe while
+    # stdin is being fed, and with -err_detect ignore_err a long, partially
+    # corrupt upload emits per-packet errors — once the 64 KiB pipe buffer
+    # fills, ffmpeg blocks on stderr, stops reading stdin, and the feeder
+    # thread hangs forever without ever reaching the wait() timeout.
+    stderr_path = f"{output_path}.stderr"
+    try:
+        with open(stderr_path, "w+b") as stderr_file:
+            proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=stderr_file)
+            try:
+                shutil.copyfileobj(upload.file, proc.stdin, length=4 * 1024 * 1024)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg bailed early; the return code below decides
+            try:
+                returncode = proc.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                return False
+            if returncode != 0:
+                stderr_file.seek(max(0, os.path.getsize(stderr_path) - 200))
+                tail = stderr_file.read().decode(errors="replace")
+                print(f"[_stream_to_wav] ffmpeg exited {returncode}: {tail}")
+                return False
+    finally:
+        try:
+            os.unlink(stderr_path)
+        except OSError:
+            pass
+    return os.path.exists(output_path) and os.path.getsize(output_path) > 0
+
+
+def _ingest_to_wav(upload: UploadFile, workdir: str, fallback_name: str = "upload") -> str:
+    """Get an upload onto disk as 44.1kHz/16-bit stereo WAV with minimal I/O.
+
+    WAV uploads are persisted as-is so _to_wav's canonical-format skip can
+    avoid ffmpeg entirely; everything else is piped straight into ffmpeg's
+    stdin, with the persist-then-convert path as fallback.
+    """
+    _enforce_upload_size(upload)
+    if upload.filename:
+        _reject_undecodable(upload.filename)
+    # Prefix with the role name so two uploads with the same filename
+    # (e.g. target and reference both called song.wav) never collide when
+    # ingested into a shared workdir — possibly concurrently
+    name = f"{fallback_name}-{os.path.basename(upload.filename)}" if upload.filename else fallback_name
+    ext = os.path.splitext(name.lower())[1]
+    if ext not in {".wav", ".wave"}:
+        base = os.path.splitext(os.path.basename(name))[0]
+        streamed_path = os.path.join(workdir, f"{base}.stream.wav")
+        if _stream_to_wav(upload, streamed_path):
+            return streamed_path
+        print(f"[_ingest_to_wav] Streaming decode failed for {name}, retrying from disk")
+    upload_path = os.path.join(workdir, name)
+    _persist_upload(upload, upload_path)
+    return _to_wav(upload_path, workdir)
+
+
+# Converted-WAV cache: users routinely re-upload the same track (new
+# reference, retry after a timeout), and the decode is deterministic, so
+# keying on a content hash lets repeats skip ffmpeg entirely. Entries are
+# hardlinked out, mtime-touched on hit, and trimmed oldest-first past the cap.
+_WAV_CACHE_DIR = os.path.join(tempfile.gettempdir(), "sb-wav-cache")
+os.makedirs(_WAV_CACHE_DIR, exist_ok=True)
+_WAV_CACHE_MAX_BYTES = 2 << 30
+_WAV_CACHE_LOCK = threading.Lock()
+
+
+def _file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb", buffering=0) as f:
+        while chunk := f.read(4 * 1024 * 1024):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _wav_cache_get(digest: str, output_path: str) -> bool:
+    """Materialize a cached conversion at output_path; False on miss."""
+    cache_path = os.path.join(_WAV_CACHE_DIR, f"{digest}.wav")
+    try:
+        os.utime(cache_path)  # refresh LRU position; ENOENT == miss
+        try:
+            os.link(cache_path, output_path)
+        except OSError:  # cross-device (tmpfs workdir): fall back to a copy
+            shutil.copyfile(cache_path, output_path)
+        return True
+    except OSError:
+        return False
+
+
+def _wav_cache_put(digest: str, wav_path: str) -> None:
+    cache_path = os.path.join(_WAV_CACHE_DIR, f"{digest}.wav")
+    try:
+        try:
+            os.link(wav_path, cache_path)
+        except FileExistsError:
+            return
+        except OSError:
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            shutil.copyfile(wav_path, tmp_path)
+            os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[_wav_cache] Insert failed ({e})")
+        return
+    with _WAV_CACHE_LOCK:
+        try:
+            entries = []
+            total = 0
+            for name in os.listdir(_WAV_CACHE_DIR):
+                p = os.path.join(_WAV_CACHE_DIR, name)
+                st = os.stat(p)
+                entries.append((st.st_mtime, st.st_size, p))
+                total += st.st_size
+            entries.sort()
+            while total > _WAV_CACHE_MAX_BYTES and entries:
+                mtime, size, p = entries.pop(0)
+                os.unlink(p)
+                total -= size
+        except OSError:
+            pass
+
+
+def _decode_with_av(input_path: str, output_path: str) -> bool:
+    """Decode + resample in-process through PyAV's libavcodec bindings.
+
+    Skips the fork/exec and codec-registration cost of an ffmpeg subprocess
+    (~50-150ms per launch), which dominates for short clips. Returns False on
+    any decode problem so the caller can fall back to the ffmpeg subprocess,
+    whose stderr produces the user-facing validation error.
+    """
+    try:
+        with av.open(input_path) as container:
+            if not container.streams.audio:
+                return False
+            stream = container.streams.audio[0]
+            stream.thread_type = "AUTO"  # frame+slice threading inside libavcodec
+            resampler = av.AudioResampler(format="s16", layout="stereo", rate=44100)
+            frames_written = 0
+            with wave.open(output_path, "wb") as wav:
+                wav.setnchannels(2)
+                wav.setsampwidth(2)
+                wav.setframerate(44100)
+                for frame in container.decode(stream):
+                    for out in resampler.resample(frame):
+                        wav.writeframes(out.to_ndarray().tobytes())
+                        frames_written += out.samples
+                for out in resampler.resample(None):  # drain the resampler
+                    wav.writeframes(out.to_ndarray().tobytes())
+                    frames_written += out.samples
+        if frames_written == 0:
+            os.unlink(output_path)
+            return False
+        return True
+    except Exception as e:
+        print(f"[_decode_with_av] PyAV decode failed ({e}), falling back to ffmpeg")
+        if os.path.exists(output_path):
+            os.unlink(output_path)
+        return False
+
+
 def _to_wav(input_path: str, workdir: str) -> str:
     """Convert any input audio to 44.1kHz 16-bit stereo WAV using ffmpeg, with tolerant flags."""
     print(f"[_to_wav] Converting {input_path}")
     
-    # Validate input file exists and has content
-    if not os.path.exists(input_path):
+    # One stat covers existence and size together
+    try:
+        file_size = os.stat(input_path).st_size
+    except FileNotFoundError:
         raise HTTPException(status_code=400, detail=f"Input file does not exist: {input_path}")
-    
-    file_size = os.path.getsize(input_path)
     print(f"[_to_wav] Input file size: {file_size} bytes")
-    
+
     if file_size == 0:
         raise HTTPException(status_code=400, detail="Uploaded file is empty")
-    
+
     if file_size < 1024:  # Less than 1KB is probably not a valid audio file
         raise HTTPException(status_code=400, detail="Uploaded file is too small to be a valid audio file")
-    
+
     base, ext = os.path.splitext(os.path.basename(input_path))
+
+    # Fast path: if the upload is already a canonical 44.1kHz/16-bit stereo WAV
+    # there is nothing for ffmpeg to do — skip the fork + decode + re-encode
+    can_copy = False
+    try:
+        info = sf.info(input_path)
+        if info.samplerate == 44100 and info.channels == 2 and info.subtype == "PCM_16":
+            if info.format == "WAV" and ext.lower() in {".wav", ".wave"}:
+                print(f"[_to_wav] Already canonical 44.1kHz/16-bit stereo WAV, skipping conversion")
+                return input_path
+            # Correct little-endian PCM in an odd or broken container:
+            # remux with -c:a copy instead of decoding + re-encoding
+            can_copy = info.format in {"WAV", "WAVEX", "RF64"}
+    except Exception as e:
+        print(f"[_to_wav] Header probe failed ({e}), falling back to ffmpeg")
+
     output_path = os.path.join(workdir, f"{base}.wav")
     
     # If input is already a .wav at the same path, write to a different filename
     if ext.lower() in {".wav", ".wave"} and os.path.abspath(input_path) == os.path.abspath(output_path):
         output_path = os.path.join(workdir, f"{base}.converted.wav")
-    
-    # First, probe the file to check if it's valid audio
-    probe_cmd = [
-        "ffmpeg",
-        "-hide_banner",
-        "-nostdin",
-        "-i", input_path,
-        "-f", "null",
-        "-"
-    ]
-    
+
+    # Re-uploads of a track we've already converted skip the decode entirely
+    digest = None
     try:
-        print(f"[_to_wav] Probing audio file...")
-        result = subprocess.run(probe_cmd, capture_output=True, text=True, timeout=10)
-        if result.returncode != 0:
-            print(f"[_to_wav] Probe failed: {result.stderr}")
-            raise HTTPException(status_code=400, detail=f"Invalid audio file format or corrupted file. Error: {result.stderr[-200:]}")
-    except subprocess.TimeoutExpired:
-        raise HTTPException(status_code=400, detail="Audio file validation timed out - file may be corrupted")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to validate audio file: {str(e)}")
-    
-    # Now convert to WAV
+        digest = _file_digest(input_path)
+        if _wav_cache_get(digest, output_path):
+            print(f"[_to_wav] Conversion cache hit for {digest}")
+            return output_path
+    except OSError as e:
+        print(f"[_to_wav] Cache lookup failed ({e})")
+
+    # In-process decode via libavcodec when PyAV is available: no fork/exec,
+    # no probe pass. Stream-copy remuxes stay with ffmpeg (cheaper than a
+    # PyAV decode), and any PyAV failure falls through to the subprocess.
+    if not can_copy and _HAS_AV and _decode_with_av(input_path, output_path):
+        print(f"[_to_wav] Decoded in-process via PyAV, output size: {os.path.getsize(output_path)} bytes")
+        if digest:
+            _wav_cache_put(digest, output_path)
+        return output_path
+
+    # Single conversion pass: a corrupt file fails here with the same ffmpeg
+    # stderr a separate probe run would produce, so validating up front just
+    # doubled the process launches and decoded every file twice
     cmd = [
         "ffmpeg",
         "-hide_banner",
         "-nostdin",
+        "-threads", _FFMPEG_THREADS,
+        "-filter_threads", _FFMPEG_THREADS,
         "-y",
         "-loglevel",
         "error",  # Only show errors
@@ -363,12 +1123,20 @@ def _to_wav(input_path: str, workdir: str) -> str:
         "-i",
         input_path,
         "-vn",  # No video
-        "-ac",
-        "2",    # Stereo
-        "-ar",
-        "44100", # 44.1kHz
-        "-c:a",
-        "pcm_s16le",  # 16-bit PCM
+    ]
+    if can_copy:
+        # Stream-copy the existing pcm_s16le data into a clean RIFF header
+        cmd += ["-c:a", "copy"]
+    else:
+        cmd += [
+            "-ac",
+            "2",    # Stereo
+            "-ar",
+            "44100", # 44.1kHz
+            "-c:a",
+            "pcm_s16le",  # 16-bit PCM
+        ]
+    cmd += [
         "-f", "wav",  # Force WAV format
         output_path,
     ]
@@ -379,46 +1147,121 @@ def _to_wav(input_path: str, workdir: str) -> str:
         result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
         if result.returncode != 0:
             print(f"[_to_wav] Conversion failed: {result.stderr}")
+            if "Invalid data found" in result.stderr or "moov atom not found" in result.stderr:
+                raise HTTPException(status_code=400, detail=f"Invalid audio file format or corrupted file. Error: {result.stderr[-200:]}")
             raise HTTPException(status_code=400, detail=f"Audio conversion failed: {result.stderr[-200:]}")
     except subprocess.TimeoutExpired:
         raise HTTPException(status_code=400, detail="Audio conversion timed out - file may be too large or corrupted")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Conversion error: {str(e)}")
     
-    if not os.path.exists(output_path):
+    try:
+        output_size = os.stat(output_path).st_size
+    except FileNotFoundError:
         raise HTTPException(status_code=400, detail="Audio conversion completed but output file was not created")
-    
-    output_size = os.path.getsize(output_path)
     print(f"[_to_wav] Conversion successful, output size: {output_size} bytes")
-    
-    if output_size == 0:
+
+    if output_size <= 44:  # nothing past the RIFF header means no audio decoded
         raise HTTPException(status_code=400, detail="Audio conversion produced empty file")
-    
+
+    if digest:
+        _wav_cache_put(digest, output_path)
     return output_path
 
 
+def _to_wav_batch(input_paths: List[str], workdir: str) -> List[str]:
+    """Convert several files sharing a single ffmpeg launch.
+
+    Canonical WAVs skip conversion outright, and with PyAV present each file
+    already decodes in-process, so batching only kicks in when two or more
+    files genuinely need an ffmpeg subprocess — those then share one
+    fork/exec + codec registration instead of paying it per file.
+    """
+    outputs: List[Optional[str]] = [None] * len(input_paths)
+    pending = []
+    for i, path in enumerate(input_paths):
+        try:
+            info = sf.info(path)
+            ext = os.path.splitext(path)[1].lower()
+            if (info.samplerate == 44100 and info.channels == 2
+                    and info.subtype == "PCM_16" and info.format == "WAV"
+                    and ext in {".wav", ".wave"}):
+                outputs[i] = path
+                continue
+        except Exception:
+            pass
+        pending.append(i)
+
+    if _HAS_AV or len(pending) <= 1:
+        for i in pending:
+            outputs[i] = _to_wav(input_paths[i], workdir)
+        return outputs
+
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-nostdin",
+        "-threads", _FFMPEG_THREADS,
+        "-filter_threads", _FFMPEG_THREADS,
+        "-y",
+        "-loglevel", "error",
+        "-err_detect", "ignore_err",
+    ]
+    for i in pending:
+        cmd += ["-i", input_paths[i]]
+    used = set()
+    for slot, i in enumerate(pending):
+        base = os.path.splitext(os.path.basename(input_paths[i]))[0]
+        out = os.path.join(workdir, f"{base}.wav")
+        if out in used or os.path.abspath(out) == os.path.abspath(input_paths[i]):
+            out = os.path.join(workdir, f"{base}.{slot}.converted.wav")
+        used.add(out)
+        outputs[i] = out
+        cmd += ["-map", f"{slot}:a", "-ac", "2", "-ar", "44100", "-c:a", "pcm_s16le", "-f", "wav", out]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode == 0 and all(
+            os.path.exists(outputs[i]) and os.path.getsize(outputs[i]) > 0 for i in pending
+        ):
+            return outputs
+        print(f"[_to_wav_batch] Batched conversion failed, retrying per file: {result.stderr[-200:]}")
+    except Exception as e:
+        print(f"[_to_wav_batch] Batched conversion error ({e}), retrying per file")
+    # Per-file retry keeps _to_wav's validation and error mapping
+    for i in pending:
+        outputs[i] = _to_wav(input_paths[i], workdir)
+    return outputs
+
+
 def _apply_volume_control(input_path: str, workdir: str, target_lufs: float = -14.0, max_peak: float = -1.0) -> str:
     """Apply volume control and clipping prevention to mastered audio."""
     print(f"[_apply_volume_control] Processing {input_path}")
     
     try:
-        # Load audio using librosa
-        audio, sr = librosa.load(input_path, sr=None, mono=False)
-        
+        # Input is the PCM16 WAV matchering just wrote: read it straight with
+        # soundfile as float32 instead of a third librosa/audioread decode
+        # pass (and librosa's float64 buffers)
+        audio, sr = sf.read(input_path, dtype="float32", always_2d=True)
+        audio = audio.T  # (channels, samples)
+
         # Ensure stereo format
-        if audio.ndim == 1:
-            audio = np.stack([audio, audio])
+        if audio.shape[0] == 1:
+            audio = np.vstack([audio, audio])
         elif audio.shape[0] > 2:
             audio = audio[:2]  # Take only first 2 channels
         
-        # Calculate current peak level
-        current_peak = np.max(np.abs(audio))
+        # Calculate current peak and RMS (fused into one pass under numba)
+        if _HAS_NUMBA:
+            current_peak, rms = _peak_rms_nb(np.ascontiguousarray(audio))
+        else:
+            current_peak = float(np.max(np.abs(audio)))
+            rms = float(np.sqrt(np.mean(audio**2)))
         current_peak_db = 20 * np.log10(current_peak) if current_peak > 0 else -np.inf
-        
+
         print(f"[_apply_volume_control] Current peak: {current_peak_db:.2f} dB")
-        
-        # Calculate LUFS using simple RMS approximation
-        rms = np.sqrt(np.mean(audio**2))
         current_lufs_approx = 20 * np.log10(rms) - 0.691 if rms > 0 else -np.inf
         
         print(f"[_apply_volume_control] Estimated current LUFS: {current_lufs_approx:.2f}")
@@ -437,15 +1280,15 @@ def _apply_volume_control(input_path: str, workdir: str, target_lufs: float = -1
         
         print(f"[_apply_volume_control] Applying gain: {final_gain_db:.2f} dB")
         
-        # Apply gain
+        # Apply gain, soft limiting, and the final peak check — one fused
+        # read-modify-write pass under numba, separate passes otherwise
         gain_linear = 10**(final_gain_db / 20)
-        audio_adjusted = audio * gain_linear
-        
-        # Apply soft limiting to prevent clipping
-        audio_limited = _soft_limit(audio_adjusted, threshold=0.95)
-        
-        # Verify final peak level
-        final_peak = np.max(np.abs(audio_limited))
+        if _HAS_NUMBA:
+            audio_limited, final_peak = _gain_limit_nb(np.ascontiguousarray(audio), gain_linear, 0.95)
+        else:
+            audio_adjusted = audio * gain_linear
+            audio_limited = _soft_limit(audio_adjusted, threshold=0.95)
+            final_peak = float(np.max(np.abs(audio_limited)))
         final_peak_db = 20 * np.log10(final_peak) if final_peak > 0 else -np.inf
         
         print(f"[_apply_volume_control] Final peak: {final_peak_db:.2f} dB")
@@ -453,10 +1296,9 @@ def _apply_volume_control(input_path: str, workdir: str, target_lufs: float = -1
         # Save processed audio
         output_path = os.path.join(workdir, "mastered_controlled.wav")
         
-        # Convert back to int16 and save using scipy
-        import soundfile as sf
-        audio_int16 = (audio_limited * 32767).astype(np.int16)
-        sf.write(output_path, audio_int16.T, sr, subtype='PCM_16')
+        # libsndfile converts float to PCM_16 natively — no need to scale and
+        # cast by hand, which kept a second full-length buffer alive
+        sf.write(output_path, audio_limited.T, sr, subtype='PCM_16')
         
         return output_path
         
@@ -468,6 +1310,8 @@ def _apply_volume_control(input_path: str, workdir: str, target_lufs: float = -1
 
 def _soft_limit(audio: np.ndarray, threshold: float = 0.95) -> np.ndarray:
     """Apply soft limiting to prevent clipping - reduced to half strength."""
+    if _HAS_NUMBA:
+        return _soft_limit_nb(np.ascontiguousarray(audio), threshold)
     # Simple tanh-based soft limiter with reduced strength (50% mix with original)
     mask = np.abs(audio) > threshold
     fully_limited = np.where(mask, 
@@ -478,6 +1322,314 @@ def _soft_limit(audio: np.ndarray, threshold: float = 0.95) -> np.ndarray:
     return limited
 
 
+# BPM / key analysis helpers
+_KEY_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
+# Krumhansl-Schmuckler key profiles
+_MAJOR_PROFILE = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+_MINOR_PROFILE = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+# All 24 key profiles (12 major rotations then 12 minor), mean-centered and
+# unit-normalized once so scoring a chroma vector is a single (24,12) matvec
+_KEY_PROFILES = np.stack(
+    [np.roll(_MAJOR_PROFILE, i) for i in range(12)] + [np.roll(_MINOR_PROFILE, i) for i in range(12)]
+)
+_KEY_PROFILES = _KEY_PROFILES - _KEY_PROFILES.mean(axis=1, keepdims=True)
+_KEY_PROFILES /= np.linalg.norm(_KEY_PROFILES, axis=1, keepdims=True)
+
+
+@lru_cache(maxsize=8)
+def _hann(n_fft: int) -> np.ndarray:
+    return np.hanning(n_fft).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def _freqs(n_bins: int, sr: int) -> np.ndarray:
+    # rfftfreq of the underlying n_fft = 2 * (n_bins - 1) transform
+    return np.fft.rfftfreq(2 * (n_bins - 1), 1.0 / sr).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def _bin2pc(n_bins: int, sr: int) -> np.ndarray:
+    """(12, n_bins) projection from FFT bins to pitch classes, restricted to
+    the 80-2000 Hz musical range, so chroma folding is a single matvec."""
+    freqs = _freqs(n_bins, sr)
+    midi = 69 + 12 * np.log2(np.maximum(freqs, 1e-6) / 440.0)
+    pc = np.mod(np.rint(midi).astype(np.int64), 12)
+    mask = (freqs >= 80) & (freqs <= 2000)
+    P = np.zeros((12, n_bins), dtype=np.float32)
+    P[pc[mask], np.where(mask)[0]] = 1.0
+    return P
+
+
+def _stft_mag(y: np.ndarray, n_fft: int = 2048, hop_length: int = 512) -> np.ndarray:
+    """Compute a magnitude spectrogram of shape (n_fft // 2 + 1, num_frames).
+
+    All frames are built at once with a strided view and windowed/transformed
+    as a single (num_frames, n_fft) batch, so pocketfft vectorizes across
+    frames instead of paying Python overhead per hop.
+    """
+    if y.size < n_fft:
+        y = np.pad(y, (0, n_fft - y.size), mode="constant")
+    window = _hann(n_fft)
+    frames = sliding_window_view(y, n_fft)[::hop_length]
+    frames = frames * window[None, :]
+    # scipy's pocketfft wrapper can fan the batched transform out across all
+    # cores and reuse its plan cache between calls, unlike np.fft
+    S = np.abs(_rfft(frames, n=n_fft, axis=1, workers=-1, overwrite_x=True)).T.astype(np.float32, copy=False)
+    return S
+
+
+if _HAS_NUMBA:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _flux_and_acf(S, min_lag, max_lag):
+        """Fused spectral flux + autocorrelation over the BPM lag window only.
+
+        Computing the ACF just for [min_lag, max_lag) is O(N * window) instead
+        of the O(N^2) full-length correlate, and fusing the flux reduction
+        avoids materializing the (n_bins, n_frames) diff matrix.
+        """
+        n_bins, n_frames = S.shape
+        n = n_frames - 1
+        flux = np.zeros(n, dtype=np.float32)
+        for t in prange(n):
+            acc = 0.0
+            for b in range(n_bins):
+                d = S[b, t + 1] - S[b, t]
+                if d > 0.0:
+                    acc += d
+            flux[t] = acc
+        mean = flux.mean()
+        for t in range(n):
+            flux[t] -= mean
+        acf = np.zeros(max_lag - min_lag, dtype=np.float32)
+        for k in prange(min_lag, max_lag):
+            s = 0.0
+            for t in range(n - k):
+                s += flux[t] * flux[t + k]
+            acf[k - min_lag] = s
+        return acf
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _soft_limit_nb(audio, threshold):
+        """Fused soft limiter: one read and one write per sample instead of
+        the numpy version's four full-size intermediates; fastmath lets LLVM
+        vectorize the tanh."""
+        out = np.empty_like(audio)
+        flat = audio.reshape(-1)
+        dst = out.reshape(-1)
+        for i in prange(flat.size):
+            x = flat[i]
+            ax = abs(x)
+            if ax > threshold:
+                limited = math.copysign(
+                    threshold + (1.0 - threshold) * math.tanh((ax - threshold) / (1.0 - threshold)), x
+                )
+                # Same 50% limited / 50% dry mix as the numpy version
+                dst[i] = 0.5 * x + 0.5 * limited
+            else:
+                dst[i] = x
+        return out
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _peak_rms_nb(a):
+        """Peak and RMS in one sweep instead of two full passes over the track."""
+        flat = a.reshape(-1)
+        peak = 0.0
+        acc = 0.0
+        for i in prange(flat.size):
+            x = flat[i]
+            acc += x * x
+            peak = max(peak, abs(x))
+        return peak, math.sqrt(acc / flat.size)
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _gain_limit_nb(a, gain, threshold):
+        """Fused gain + soft limit + output peak: one read and one write per
+        sample, versus three separate full-size passes."""
+        out = np.empty_like(a)
+        flat = a.reshape(-1)
+        dst = out.reshape(-1)
+        peak = 0.0
+        for i in prange(flat.size):
+            x = flat[i] * gain
+            ax = abs(x)
+            if ax > threshold:
+                limited = math.copysign(
+                    threshold + (1.0 - threshold) * math.tanh((ax - threshold) / (1.0 - threshold)), x
+                )
+                x = 0.5 * x + 0.5 * limited
+                ax = abs(x)
+            dst[i] = x
+            peak = max(peak, ax)
+        return out, peak
+
+    # Trigger (disk-cached) compilation at import so the first request doesn't pay for it
+    _flux_and_acf(np.zeros((4, 8), dtype=np.float32), 1, 3)
+    _soft_limit_nb(np.zeros((2, 4), dtype=np.float32), 0.95)
+    _peak_rms_nb(np.zeros((2, 4), dtype=np.float32))
+    _gain_limit_nb(np.zeros((2, 4), dtype=np.float32), 1.0, 0.95)
+
+
+def _estimate_bpm(S: np.ndarray, sr: int, hop_length: int = 512) -> float:
+    """Estimate tempo from a magnitude spectrogram via spectral flux + autocorrelation."""
+    fps = sr / hop_length  # onset-envelope frames per second
+
+    def lag_for(bpm: float) -> int:
+        return int(round(fps * 60.0 / bpm))
+
+    n_frames = S.shape[1]
+    if n_frames < 5:
+        return 120.0
+    min_lag = max(lag_for(200.0), 1)
+    max_lag = min(lag_for(60.0), n_frames - 2)
+    if max_lag <= min_lag:
+        return 120.0
+
+    if _HAS_NUMBA:
+        search = _flux_and_acf(S, min_lag, max_lag)
+    else:
+        flux = np.diff(S, axis=1)
+        onset_env = np.maximum(flux, 0.0).sum(axis=0)
+        onset_env = onset_env - onset_env.mean()
+        # FFT-based autocorrelation: O(N log N) instead of the O(N^2)
+        # np.correlate, of which only the BPM lag window is ever consumed
+        N = onset_env.size
+        M = 1 << (2 * N - 1).bit_length()
+        F = _rfft(onset_env, n=M, workers=-1)
+        acf = _irfft(F * np.conj(F), n=M, workers=-1)[:N]
+        search = acf[min_lag:max_lag]
+
+    # Refine the integer-lag peak with 3-point parabolic interpolation —
+    # at 43 fps the lag grid alone quantizes 120 BPM down to 117.5
+    i = int(np.argmax(search))
+    lag = float(min_lag + i)
+    if 0 < i < len(search) - 1:
+        y0, y1, y2 = float(search[i - 1]), float(search[i]), float(search[i + 1])
+        denom = y0 - 2.0 * y1 + y2
+        if denom != 0.0:
+            delta = 0.5 * (y0 - y2) / denom
+            if -1.0 < delta < 1.0:
+                lag += delta
+    bpm = 60.0 * fps / lag
+
+    # Fold octave errors back into a plausible tempo range
+    while bpm < 70.0:
+        bpm *= 2.0
+    while bpm > 180.0:
+        bpm /= 2.0
+    return round(float(bpm), 1)
+
+
+def _estimate_key(S: np.ndarray, sr: int) -> str:
+    """Estimate the musical key by matching a chroma vector against Krumhansl profiles."""
+    # Chroma quality is insensitive to mantissa bits, so run the bandwidth-
+    # bound bin reduction at half precision (numpy still accumulates the
+    # float16 mean in float32); downstream scoring stays float32/float64
+    mean_bin = S.astype(np.float16, copy=False).mean(axis=1).astype(np.float32)
+    # The cached projection folds masking and the bin histogram into one matvec
+    chroma = (_bin2pc(S.shape[0], sr) @ mean_bin).astype(np.float64)
+
+    if chroma.sum() <= 0:
+        return "C Major"
+
+    c = chroma - chroma.mean()
+    norm = np.linalg.norm(c)
+    if norm == 0:
+        return "C Major"
+    scores = _KEY_PROFILES @ (c / norm)
+    idx = int(np.argmax(scores))
+    return f"{_KEY_NAMES[idx % 12]} {'Major' if idx < 12 else 'Minor'}"
+
+
+def _analyze_wav(wav_path: str) -> dict:
+    """Decode, mix to mono, resample to 22.05 kHz and run the BPM/key pass
+    over one shared spectrogram. Blocking; callers run it off the event loop."""
+    with sf.SoundFile(wav_path) as snd:
+        sr = src_sr = snd.samplerate
+        # Mix to mono block-by-block into one preallocated buffer so
+        # peak memory is ~1x mono instead of full stereo + mono copies
+        y = np.empty(snd.frames, dtype=np.float32)
+        off = 0
+        for block in snd.blocks(blocksize=1 << 20, dtype="float32", always_2d=True):
+            m = block.mean(axis=1)
+            y[off:off + len(m)] = m
+            off += len(m)
+        y = y[:off]
+    duration = float(len(y)) / sr
+
+    # Analyze at 22.05 kHz; plenty of bandwidth for tempo and chroma
+    target_sr = 22050
+    if sr != target_sr:
+        try:
+            import soxr  # SIMD C resampler, much faster than the scipy filter
+            y = soxr.resample(y, sr, target_sr, quality="HQ").astype(np.float32, copy=False)
+        except ImportError:
+            from scipy.signal import resample_poly
+            g = np.gcd(int(sr), target_sr)
+            y = resample_poly(y, target_sr // g, int(sr) // g).astype(np.float32)
+        sr = target_sr
+
+    S = _stft_mag(y)
+    return {
+        "bpm": _estimate_bpm(S, sr),
+        "key": _estimate_key(S, sr),
+        "duration": round(duration, 2),
+        # Report the decoded file's rate, not the 22.05 kHz analysis rate
+        "sample_rate": int(src_sr),
+    }
+
+
+# Analysis is deterministic in the upload bytes, so repeat submissions (users
+# re-running the UI on the same track) are served from a bounded LRU keyed by
+# content hash and skip the whole decode + STFT pipeline
+_ANALYSIS_CACHE: "OrderedDict[str, dict]" = OrderedDict()
+_ANALYSIS_CACHE_LOCK = threading.Lock()
+_ANALYSIS_CACHE_MAX = 4096
+
+
+@app.post("/analyze/bpm-key")
+async def analyze_bpm_key(audio: UploadFile = File(...)):
+    """Analyze uploaded audio for BPM and musical key.
+    Returns: {"bpm": float, "key": string, "duration": float, "sample_rate": int}
+    """
+    print(f"[analyze/bpm-key] Received file: {audio.filename}")
+
+    with _borrow_tmpdir() as tmpdir:
+        try:
+            # Save uploaded file, hashing it as it streams to disk. basename()
+            # the client-controlled filename so a crafted "../../etc/x" name
+            # can't write outside the scratch dir — same as _ingest_to_wav
+            input_path = os.path.join(tmpdir, os.path.basename(audio.filename or "") or "audio")
+            hasher = hashlib.blake2b(digest_size=32)
+            await _persist_upload_async(audio, input_path, hasher)
+            digest = hasher.hexdigest()
+
+            with _ANALYSIS_CACHE_LOCK:
+                cached = _ANALYSIS_CACHE.get(digest)
+                if cached is not None:
+                    _ANALYSIS_CACHE.move_to_end(digest)
+            if cached is not None:
+                print(f"[analyze/bpm-key] Cache hit for {digest[:12]}")
+                return cached
+
+            # Convert to WAV using existing function
+            wav_path = await asyncio.to_thread(_to_wav, input_path, tmpdir)
+
+            result = await asyncio.to_thread(_analyze_wav, wav_path)
+            with _ANALYSIS_CACHE_LOCK:
+                _ANALYSIS_CACHE[digest] = result
+                _ANALYSIS_CACHE.move_to_end(digest)
+                while len(_ANALYSIS_CACHE) > _ANALYSIS_CACHE_MAX:
+                    _ANALYSIS_CACHE.popitem(last=False)
+            print(f"[analyze/bpm-key] Result: {result}")
+            return result
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            print(f"[analyze/bpm-key] Error: {e}")
+            raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+
+
 @app.post("/analyze")
 async def analyze_audio(audio: UploadFile = File(...)):
     """Analyze uploaded audio file for BPM and key detection.
@@ -485,29 +1637,30 @@ async def analyze_audio(audio: UploadFile = File(...)):
     """
     print(f"[analyze] Received file: {audio.filename}")
     
-    with tempfile.TemporaryDirectory() as tmpdir:
+    with _borrow_tmpdir() as tmpdir:
         try:
-            # Save uploaded file
-            input_path = os.path.join(tmpdir, audio.filename or "audio")
-            with open(input_path, "wb") as f:
-                shutil.copyfileobj(audio.file, f)
-            
-            # Convert to WAV using existing function
-            wav_path = _to_wav(input_path, tmpdir)
+            # Compressed uploads pipe straight into ffmpeg's stdin; plain WAVs
+            # persist as-is and skip conversion — same ingest as /master
+            wav_path = await asyncio.to_thread(_ingest_to_wav, audio, tmpdir, "audio")
             print(f"[analyze] Converted to WAV: {wav_path}")
-            
-            # For now, return mock data
-            # TODO: Integrate actual BPM/key analysis library
+
+            result = await asyncio.to_thread(_analyze_wav, wav_path)
+
+            # This endpoint has always returned display-formatted strings, so
+            # keep that shape for existing clients
+            minutes, seconds = divmod(int(round(result["duration"])), 60)
             analysis_result = {
-                "bpm": 128.0,
-                "key": "A Minor", 
-                "duration": "3:24",
-                "sample_rate": "44.1 kHz"
+                "bpm": result["bpm"],
+                "key": result["key"],
+                "duration": f"{minutes}:{seconds:02d}",
+                "sample_rate": f"{result['sample_rate'] / 1000:g} kHz",
             }
-            
-            print(f"[analyze] Mock analysis complete: {analysis_result}")
+
+            print(f"[analyze] Analysis complete: {analysis_result}")
             return analysis_result
-            
+
+        except HTTPException:
+            raise
         except Exception as e:
             print(f"[analyze] Error: {e}")
             raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")